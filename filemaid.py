@@ -2,29 +2,65 @@
 
 import abc
 import argparse
+import collections
+import concurrent.futures
 import functools
+import importlib.util
 import itertools
+import json
+import mimetypes
 import operator
 import os
 import re
 import shutil
 import sys
+import tempfile
 import textwrap
-from datetime import datetime, timedelta
+import threading
+import time
+from datetime import timedelta
+from stat import S_ISREG
 
 import magic
 import yaml
 
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+try:
+    from yaml import CSafeLoader as YamlLoader
+except ImportError:
+    from yaml import SafeLoader as YamlLoader
+
 SUCCESS_EXIT_STATUS = 0
 FAILURE_EXIT_STATUS = 1
 ENCODING = 'UTF-8'
+RULES_CACHE_SUFFIX = '.cache.json'
+COMPILED_RULES_SUFFIX = '.py'
+READ_FLAGS = os.O_RDONLY | getattr(os, 'O_BINARY', 0)
+NOATIME_FLAG = getattr(os, 'O_NOATIME', 0)
+# The ioctl to share a file's extents with another file (a reflink) on Linux filesystems like Btrfs and XFS
+FICLONE = getattr(fcntl, 'FICLONE', 0x40049409) if fcntl and sys.platform.startswith('linux') else None
+WRITE_FLAGS = os.O_WRONLY | os.O_CREAT | os.O_TRUNC | getattr(os, 'O_BINARY', 0)
+
+# Detected mime types by path and number of magic bytes, shared by all mime conditions so that files are only sniffed
+# once no matter how many rules look at them
+MIME_CACHE = {}
+PATTERN_SET_CACHE_SIZE = 256
+DESTINATION_LOCKS = collections.defaultdict(threading.Lock)
+# How many entries may be queued per job, so that the walk doesn't run arbitrarily far ahead of processing
+PENDING_ENTRIES_PER_JOB = 2
 
 argument_parser = argparse.ArgumentParser()
 argument_parser.add_argument('rules')
-argument_parser.add_argument('path')
+argument_parser.add_argument('path', nargs='?')
 argument_parser.add_argument('--dry-run', '-d', action='store_true')
 argument_parser.add_argument('--recursive', '-r', action='store_true')
 argument_parser.add_argument('--follow-symlinks', '-s', action='store_true')
+argument_parser.add_argument('--jobs', '-j', type=int, default=1, help='number of files to process in parallel')
+argument_parser.add_argument('--compile', '-c', metavar='OUTPUT', help='compile the rules to a Python module and exit')
 
 
 class ConditionError(Exception):
@@ -35,7 +71,77 @@ class ActionError(Exception):
     pass
 
 
+# Conditions are matched against either plain paths or os.DirEntry objects yielded by find_paths. The latter cache the
+# file type and stat information, which saves a lot of system calls when walking large folders
+def get_path(entry):
+    return os.fspath(entry)
+
+
+def get_stat(entry):
+    if isinstance(entry, os.DirEntry):
+        return entry.stat()
+
+    return os.stat(entry)
+
+
+def get_stat_or_none(entry):
+    # Dangling symlinks, symlink loops or symlinks into unreadable folders can't be stat'ed. Conditions reordered by
+    # cost (see BaseTermCondition) must not fail on them, where a mime condition checked first would simply have
+    # rejected them as non-files
+    try:
+        return get_stat(entry)
+    except OSError:
+        return None
+
+
+def is_file(entry):
+    if isinstance(entry, os.DirEntry):
+        # Mirror os.path.isfile, DirEntry.is_file only swallows FileNotFoundError (e.g. not symlink loops)
+        try:
+            return entry.is_file()
+        except OSError:
+            return False
+
+    return os.path.isfile(entry)
+
+
+@functools.lru_cache(None)
+def compile_regex(pattern, flags=0):
+    # Rules often repeat the same patterns, share the compiled regexes between them. Unlike re's own cache this one is
+    # never cleared
+    return re.compile(pattern, flags)
+
+
+@functools.lru_cache(None)
+def get_extension_types():
+    if not mimetypes.inited:
+        mimetypes.init()
+
+    return {extension.lower(): type_ for extension, type_ in mimetypes.types_map.items()}
+
+
+def read_head(path, size):
+    # A plain file descriptor avoids setting up a buffered file object just to read a few bytes
+    try:
+        # O_NOATIME is only permitted for the owner of the file
+        file_descriptor = os.open(path, READ_FLAGS | NOATIME_FLAG)
+    except PermissionError:
+        file_descriptor = os.open(path, READ_FLAGS)
+
+    try:
+        return os.read(file_descriptor, size)
+    finally:
+        os.close(file_descriptor)
+
+
 class Matchable(metaclass=abc.ABCMeta):
+    # Relative cost of matching: 0 only looks at the path, 1 needs to stat the file and 2 needs to read the file
+    COST = 0
+
+    @property
+    def cost(self):
+        return self.COST
+
     @abc.abstractmethod
     def match(self, path):
         pass
@@ -62,13 +168,22 @@ class Rule(Matchable):
     def __repr__(self):
         condition_repr = repr(self.condition)
         actions_repr = repr(self.actions)
-        return f'Rule(\n{textwrap.indent(condition_repr, "    ")},\n{textwrap.indent(actions_repr, "    ")}\n)'
+        return (
+            f'Rule(\n    {repr(self.name)},\n{textwrap.indent(condition_repr, "    ")},\n'
+            f'{textwrap.indent(actions_repr, "    ")}\n)'
+        )
 
 
 class BaseTermCondition(Matchable):
     def __init__(self, *condition_data):
         super().__init__()
-        self.conditions = [make_condition(datum) for datum in condition_data]
+        # Evaluate cheap conditions first, so that expensive ones are skipped more often when short-circuiting
+        conditions = [make_condition(datum) for datum in condition_data]
+        self.conditions = sorted(conditions, key=operator.attrgetter('cost'))
+
+    @property
+    def cost(self):
+        return max((condition.cost for condition in self.conditions), default=0)
 
     def __repr__(self):
         condition_reprs = ',\n'.join(repr(condition) for condition in self.conditions)
@@ -90,6 +205,10 @@ class NotCondition(Matchable):
         super().__init__()
         self.condition = make_condition(condition_datum)
 
+    @property
+    def cost(self):
+        return self.condition.cost
+
     def match(self, path):
         return not self.condition.match(path)
 
@@ -97,12 +216,60 @@ class NotCondition(Matchable):
         return f'NotCondition({repr(self.condition)})'
 
 
+class PatternSet:
+    # Combines several regular expressions into a single alternation. A path that matches none of them is rejected with
+    # a single call into the regex engine, instead of one call per pattern
+    BACKREFERENCE_REGEX = re.compile(r'\\\d|\(\?P=|\(\?\(')
+
+    def __init__(self, patterns):
+        self.regex = re.compile('|'.join(f'(?:{pattern})' for pattern in patterns))
+        # The same path is checked by several conditions in a row
+        self.may_match = functools.lru_cache(PATTERN_SET_CACHE_SIZE)(self._may_match)
+
+    @classmethod
+    def combinable(cls, regex):
+        # Global inline flags can't be nested inside the alternation, and group numbers shift inside of it, which would
+        # silently break backreferences
+        return not regex.flags & ~re.UNICODE and not cls.BACKREFERENCE_REGEX.search(regex.pattern)
+
+    def _may_match(self, path):
+        return bool(self.regex.match(path))
+
+
 class PathCondition(Matchable):
+    SPECIAL_CHARACTERS = frozenset('.^$*+?{}[]\\|()')
+    OPTIONAL_QUANTIFIERS = frozenset('*?{')
+
     def __init__(self, regex):
         super().__init__()
-        self.regex = re.compile(regex)
+        self.regex = compile_regex(regex)
+        self.prefix = self.parse_literal_prefix(regex)
+        self.pattern_set = None
+
+    def parse_literal_prefix(self, regex):
+        # Patterns usually start with a literal folder, checking for it is much cheaper than running the regex
+        if '|' in regex:
+            return ''
+
+        regex = regex[1:] if regex.startswith('^') else regex
+        length = 0
+        while length < len(regex) and regex[length] not in self.SPECIAL_CHARACTERS:
+            length += 1
+
+        # The last literal character might be optional
+        if length < len(regex) and regex[length] in self.OPTIONAL_QUANTIFIERS:
+            length -= 1
+
+        return regex[:max(length, 0)]
 
     def match(self, path):
+        path = get_path(path)
+        if self.prefix and not path.startswith(self.prefix):
+            return False
+
+        if self.pattern_set and not self.pattern_set.may_match(path):
+            return False
+
         return bool(self.regex.match(path))
 
     def __repr__(self):
@@ -110,27 +277,49 @@ class PathCondition(Matchable):
 
 
 class MimeCondition(Matchable):
-    def __init__(self, regex, ignore_case=True, magic_bytes=1024):
+    COST = 2
+
+    def __init__(self, regex, ignore_case=True, magic_bytes=1024, trust_extensions=True):
         super().__init__()
-        self.regex = re.compile(regex, re.IGNORECASE if ignore_case else 0)
+        self.regex = compile_regex(regex, re.IGNORECASE if ignore_case else 0)
+        self.ignore_case = ignore_case
         self.magic_bytes = magic_bytes
+        self.trust_extensions = trust_extensions
+        # Reuse a single handle, magic.from_buffer loads the magic database on every call
+        self.magic = magic.Magic(mime=True)
+        self.extension_types = get_extension_types() if trust_extensions else {}
 
-    @functools.lru_cache(None)
     def match(self, path):
-        if not os.path.isfile(path):
+        if not is_file(path):
             return False
 
-        with open(path, 'rb') as file:
-            buffer = file.read(self.magic_bytes)
-            mime = magic.from_buffer(buffer, mime=True)
+        # Files with a well-known extension are matched by the extension's mime type without reading them. Only files
+        # with unknown extensions are sniffed, which means that misnamed files are matched by their extension
+        path = get_path(path)
+        type_ = self.extension_types.get(os.path.splitext(path)[1].lower())
+        if type_ is not None:
+            return bool(self.regex.match(type_))
+
+        return self.match_file(path)
+
+    def match_file(self, path):
+        key = path, self.magic_bytes
+        mime = MIME_CACHE.get(key)
+        if mime is None:
+            buffer = read_head(path, self.magic_bytes)
+            mime = MIME_CACHE[key] = self.magic.from_buffer(buffer)
 
         return bool(self.regex.match(mime))
 
     def __repr__(self):
-        return f'MimeCondition({repr(self.regex.pattern)}, {repr(self.magic_bytes)})'
+        return (
+            f'MimeCondition({repr(self.regex.pattern)}, {repr(self.ignore_case)}, {repr(self.magic_bytes)}, '
+            f'{repr(self.trust_extensions)})'
+        )
 
 
 class AgeCondition(Matchable):
+    COST = 1
     UNITS = {'seconds', 'minutes', 'hours', 'days', 'weeks'}
     COMPARATORS = {
         '>': operator.gt,
@@ -142,25 +331,31 @@ class AgeCondition(Matchable):
 
     def __init__(self, condition_string):
         self.condition_string = condition_string
-        self.age_predicate = self.parse_age_condition(condition_string)
+        self.compare, self.threshold = self.parse_age_condition(condition_string)
+        # Ages are measured relative to when the rules were loaded, instead of getting the current time for every file
+        self.now = time.time_ns()
 
     def parse_age_condition(self, condition_string):
         comparator_string, size_string, unit_string = condition_string.split()
         compare = self.COMPARATORS[comparator_string]
         kwargs = {unit_string.lower(): int(size_string)}
         time_delta = timedelta(**kwargs)
-        return lambda other: compare(datetime.now() - other, time_delta)
+        # Integer nanoseconds, exact unlike floating point seconds
+        return compare, time_delta // timedelta(microseconds=1) * 1000
 
     def match(self, path):
-        stat = os.stat(path)
-        date_time = datetime.fromtimestamp(stat.st_mtime)
-        return self.age_predicate(date_time)
+        stat = get_stat_or_none(path)
+        if stat is None:
+            return False
+
+        return self.compare(self.now - stat.st_mtime_ns, self.threshold)
 
     def __repr__(self):
         return f'AgeCondition({repr(self.condition_string)})'
 
 
 class SizeCondition(Matchable):
+    COST = 1
     UNITS = {
         'b': 1,
         'kb': 1024,
@@ -191,13 +386,56 @@ class SizeCondition(Matchable):
         return lambda other: compare(other, size)
 
     def match(self, path):
-        stat = os.stat(path)
+        stat = get_stat_or_none(path)
+        if stat is None:
+            return False
+
         return self.size_predicate(stat.st_size)
 
     def __repr__(self):
         return f'SizeCondition({repr(self.size_string)})'
 
 
+def clone_file(source, destination):
+    if FICLONE is None:
+        return False
+
+    source_descriptor = os.open(source, READ_FLAGS)
+    try:
+        destination_descriptor = os.open(destination, WRITE_FLAGS, 0o666)
+        try:
+            fcntl.ioctl(destination_descriptor, FICLONE, source_descriptor)
+        except OSError:
+            # Not supported by the filesystem, or source and destination are on different filesystems
+            return False
+        finally:
+            os.close(destination_descriptor)
+    finally:
+        os.close(source_descriptor)
+
+    return True
+
+
+def copy_file(source, destination, *, follow_symlinks=True):
+    # Drop-in replacement for shutil.copy2 that tries to reflink the file first, which doesn't copy any data at all.
+    # Otherwise shutil.copyfile uses the fastest copy available to the platform (e.g. sendfile on Linux)
+    if os.path.isdir(destination):
+        destination = os.path.join(destination, os.path.basename(source))
+
+    # Opening the destination truncates it, which must never happen to the source
+    if os.path.exists(destination) and os.path.samefile(source, destination):
+        raise shutil.SameFileError(f'{repr(source)} and {repr(destination)} are the same file')
+
+    # Only regular files can be cloned. Leave everything else to shutil.copyfile, which e.g. raises for named pipes
+    # instead of blocking on opening them
+    source_stat = os.stat(source) if follow_symlinks else os.lstat(source)
+    if not S_ISREG(source_stat.st_mode) or not clone_file(source, destination):
+        shutil.copyfile(source, destination, follow_symlinks=follow_symlinks)
+
+    shutil.copystat(source, destination, follow_symlinks=follow_symlinks)
+    return destination
+
+
 class BaseAction(metaclass=abc.ABCMeta):
     def __init__(self):
         self.ignore_paths = set()
@@ -211,32 +449,45 @@ class BaseAction(metaclass=abc.ABCMeta):
         return f'{self.__class__.__name__}()'
 
 
-class MoveAction(BaseAction):
+class BaseDestinationAction(BaseAction):
     def __init__(self, destination):
         super().__init__()
+        # Kept unexpanded for repr, so that compiled rules don't hardcode the compiling user's home folder
+        self.destination_string = destination
         self.destination = os.path.expanduser(destination)
         self.ignore_paths.add(self.destination)
+        self.destination_created = False
+        # Shared by all actions with the same destination
+        self.destination_lock = DESTINATION_LOCKS[os.path.abspath(self.destination)]
 
-    def apply(self, path):
-        os.makedirs(self.destination, exist_ok=True)
-        return shutil.move(path, self.destination)
+    def create_destination(self):
+        # Only create the destination folder the first time the action is applied instead of for every file
+        if self.destination_created:
+            return
 
-    def __repr__(self):
-        return f'MoveAction({repr(self.destination)})'
+        with self.destination_lock:
+            if not self.destination_created:
+                os.makedirs(self.destination, exist_ok=True)
+                self.destination_created = True
 
+    def __repr__(self):
+        return f'{self.__class__.__name__}({repr(self.destination_string)})'
 
-class CopyAction(BaseAction):
-    def __init__(self, destination):
-        super().__init__()
-        self.destination = os.path.expanduser(destination)
-        self.ignore_paths.add(self.destination)
 
+class MoveAction(BaseDestinationAction):
     def apply(self, path):
-        os.makedirs(self.destination, exist_ok=True)
-        shutil.copy2(path, self.destination)
+        self.create_destination()
+        # shutil.move checks whether the destination exists before moving, serialize moves so that files with the same
+        # name can't overwrite each other when using --jobs. Renames the file if possible, only copying it when moving
+        # to a different filesystem
+        with self.destination_lock:
+            return shutil.move(path, self.destination, copy_function=copy_file)
 
-    def __repr__(self):
-        return f'CopyAction({repr(self.destination)})'
+
+class CopyAction(BaseDestinationAction):
+    def apply(self, path):
+        self.create_destination()
+        copy_file(path, self.destination)
 
 
 class DeleteAction(BaseAction):
@@ -261,9 +512,30 @@ ACTIONS = {
 }
 
 
+CONSTRUCTORS = {
+    # arguments are keyword-arguments
+    dict: lambda class_, data: class_(**data),
+    # arguments are positonal arguments
+    list: lambda class_, data: class_(*data)
+}
+
+
+def construct_with_argument(class_, data):
+    # a single argument
+    return class_(data)
+
+
+def construct(class_, data):
+    return CONSTRUCTORS.get(type(data), construct_with_argument)(class_, data)
+
+
 def make_condition(data):
+    # Already constructed conditions, as used by compiled rules
+    if isinstance(data, Matchable):
+        return data
+
     if isinstance(data, dict):
-        type_, data = list(data.items())[0]
+        type_, data = next(iter(data.items()))
     else:
         type_, data = data, []
 
@@ -271,23 +543,14 @@ def make_condition(data):
     if not class_:
         raise ConditionError(f'unknown type: {type_}')
 
-    # arguments are keyword-arguments
-    if isinstance(data, dict):
-        return class_(**data)
-
-    # arguments are positonal arguments
-    if isinstance(data, list):
-        return class_(*data)
-
-    # a single argument
-    return class_(data)
+    return construct(class_, data)
 
 
 def make_actions(data):
     actions = []
     for datum in data:
         if isinstance(datum, dict):
-            type_, datum = list(datum.items())[0]
+            type_, datum = next(iter(datum.items()))
         else:
             type_, datum = datum, []
 
@@ -295,70 +558,251 @@ def make_actions(data):
         if not class_:
             raise ActionError(f'unknown type: {type_}')
 
-        # arguments are keyword-arguments
-        if isinstance(datum, dict):
-            action = class_(**datum)
-        # arguments are positonal arguments
-        elif isinstance(datum, list):
-            action = class_(*datum)
-        # a single argument
-        else:
-            action = class_(datum)
-        actions.append(action)
+        actions.append(construct(class_, datum))
 
     return actions
 
 
 def make_rule(data):
-    name, data = list(data.items())[0]
+    name, data = next(iter(data.items()))
     condition = make_condition(data['condition'])
     actions = make_actions(data['actions'])
     return Rule(name, condition, actions)
 
 
-def load_rules(path):
-    with open(path, encoding=ENCODING) as file:
-        config = yaml.load(file)
+def get_rules_cache_key(rules_stat):
+    # Compared for equality, so that restoring an older rules file with its modification time preserved doesn't apply
+    # the stale cached rules
+    return [rules_stat.st_mtime_ns, rules_stat.st_size]
+
+
+def read_rules_cache(cache_path, key):
+    try:
+        with open(cache_path, encoding=ENCODING) as file:
+            cache = json.load(file)
+    except (OSError, ValueError):
+        return None
 
-    # Positional priority
-    return [make_rule(data) for data in config]
+    if not isinstance(cache, dict) or cache.get('key') != key:
+        return None
 
+    return cache.get('rules')
 
-def find_paths(path, predicate=lambda path: True, recursive=True, follow_symlinks=False):
-    for root, directories, file_names in os.walk(path, followlinks=follow_symlinks):
-        for name in itertools.chain(directories, file_names, [root]):
-            path = os.path.join(root, name)
-            if predicate(path):
-                yield path
 
-        if not recursive:
+def has_only_string_keys(data):
+    if isinstance(data, dict):
+        return all(isinstance(key, str) and has_only_string_keys(value) for key, value in data.items())
+
+    if isinstance(data, list):
+        return all(has_only_string_keys(datum) for datum in data)
+
+    return True
+
+
+def write_rules_cache(cache_path, key, config):
+    # JSON turns all keys into strings, e.g. a rule named 2020 would be loaded as '2020' from the cache
+    if not has_only_string_keys(config):
+        return
+
+    # Write to a temporary file first and rename it, so that a concurrent Filemaid never reads a partial cache
+    directory = os.path.dirname(os.path.abspath(cache_path))
+    try:
+        file_descriptor, temporary_path = tempfile.mkstemp(dir=directory, suffix='.tmp')
+    except OSError:
+        return
+
+    try:
+        with open(file_descriptor, 'w', encoding=ENCODING) as file:
+            json.dump({'key': key, 'rules': config}, file)
+        os.replace(temporary_path, cache_path)
+    except (OSError, TypeError, ValueError):
+        # The rules contain something JSON can't represent (e.g. YAML dates) or the folder isn't writable
+        try:
+            os.remove(temporary_path)
+        except OSError:
+            pass
+
+
+def iter_conditions(condition):
+    yield condition
+    if isinstance(condition, BaseTermCondition):
+        for child in condition.conditions:
+            yield from iter_conditions(child)
+    elif isinstance(condition, NotCondition):
+        yield from iter_conditions(condition.condition)
+
+
+def share_path_patterns(rules):
+    path_conditions = [
+        condition
+        for rule in rules
+        for condition in iter_conditions(rule.condition)
+        if isinstance(condition, PathCondition) and PatternSet.combinable(condition.regex)
+    ]
+    if len(path_conditions) < 2:
+        return
+
+    try:
+        pattern_set = PatternSet(condition.regex.pattern for condition in path_conditions)
+    except re.error:
+        return
+
+    for condition in path_conditions:
+        condition.pattern_set = pattern_set
+
+
+def load_rules(path):
+    if path.endswith(COMPILED_RULES_SUFFIX):
+        rules = load_compiled_rules(path)
+    else:
+        # Parsing YAML is slow, so the parsed rules are cached as JSON next to the rules file
+        cache_path = path + RULES_CACHE_SUFFIX
+        key = get_rules_cache_key(os.stat(path))
+        config = read_rules_cache(cache_path, key)
+        if config is None:
+            with open(path, encoding=ENCODING) as file:
+                config = yaml.load(file, Loader=YamlLoader)
+            write_rules_cache(cache_path, key, config)
+
+        # Positional priority
+        rules = [make_rule(data) for data in config]
+
+    share_path_patterns(rules)
+    return rules
+
+
+def load_compiled_rules(path):
+    # Compiled rules import Filemaid, make sure they get this module even when Filemaid is run as a script
+    sys.modules.setdefault('filemaid', sys.modules[__name__])
+    name = os.path.splitext(os.path.basename(path))[0]
+    spec = importlib.util.spec_from_file_location(name, path)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module.RULES
+
+
+def compile_rules(yaml_path, py_path):
+    # Importing the generated module is much faster than parsing YAML, and Python caches its bytecode as well
+    rules = load_rules(yaml_path)
+    classes = itertools.chain([Rule], CONDITIONS.values(), ACTIONS.values())
+    class_names = sorted({class_.__name__ for class_ in classes})
+    rule_reprs = ',\n'.join(repr(rule) for rule in rules)
+    source = (
+        f'# Generated by Filemaid from {os.path.basename(yaml_path)}, do not edit\n'
+        f'from filemaid import {", ".join(class_names)}\n\n'
+        f'RULES = [\n{textwrap.indent(rule_reprs, "    ")}\n]\n'
+    )
+    with open(py_path, 'w', encoding=ENCODING) as file:
+        file.write(source)
+
+
+def is_directory(entry, follow_symlinks):
+    # Mirror os.walk, which treats entries whose type can't be determined (e.g. symlink loops) as non-directories
+    try:
+        return entry.is_dir(follow_symlinks=follow_symlinks)
+    except OSError:
+        return False
+
+
+def find_paths(path, predicate=lambda entry: True, recursive=True, follow_symlinks=False, ignore_paths=frozenset()):
+    # ignore_paths should contain normalized absolute paths, ignored folders are pruned entirely instead of being
+    # walked. Absolute paths are tracked alongside the walked folders, so checking them is a plain set lookup
+    roots = [(path, os.path.abspath(path))]
+    while roots:
+        root, absolute_root = roots.pop()
+        try:
+            # Read the whole folder up front, since actions might modify it while it is being iterated over
+            with os.scandir(root) as iterator:
+                entries = list(iterator)
+        except OSError:
+            # Mirror os.walk: folders that vanished or can't be read are skipped
+            continue
+
+        # Build the absolute paths by concatenation, instead of calling os.path.join for every entry
+        prefix = absolute_root if absolute_root.endswith(os.sep) else absolute_root + os.sep
+        directories = []
+        for entry in entries:
+            absolute_path = prefix + entry.name
+            if absolute_path in ignore_paths:
+                continue
+
+            if recursive and is_directory(entry, follow_symlinks):
+                directories.append((entry.path, absolute_path))
+
+            if predicate(entry):
+                yield entry
+
+        # Push in reverse so that folders are walked in the order they were found
+        roots.extend(reversed(directories))
+
+
+def make_matchers(rules):
+    # Bind the methods up front, to save the attribute lookups and the Rule.match indirection for every rule and path
+    return [(rule.name, rule.condition.match, rule.apply) for rule in rules]
+
+
+def process_entry(entry, matchers, dry_run=False):
+    for name, match, apply in matchers:
+        if match(entry):
+            if dry_run:
+                print(f'{name}: {entry.path}')
+                continue
+
+            # Potentially updated path, not used as of yet
+            path = apply(entry.path)
+            # Break after the first rule matched. Priority is given by order of appearance
             break
 
 
+def process_in_parallel(process, entries, jobs):
+    # Processing is dominated by I/O which releases the GIL, so threads do run in parallel. Executor.map would submit
+    # all entries up front, instead only a limited number of entries is queued at once
+    with concurrent.futures.ThreadPoolExecutor(jobs) as executor:
+        futures = collections.deque()
+        for entry in entries:
+            if len(futures) >= jobs * PENDING_ENTRIES_PER_JOB:
+                futures.popleft().result()
+            futures.append(executor.submit(process, entry))
+
+        for future in futures:
+            future.result()
+
+
 def main(arguments):
     if not os.path.isfile(arguments.rules):
         print(f'No such file: {arguments.rules}', file=sys.stderr)
         return FAILURE_EXIT_STATUS
 
+    if arguments.compile:
+        compile_rules(arguments.rules, arguments.compile)
+        return SUCCESS_EXIT_STATUS
+
+    if not arguments.path:
+        print('No folder given', file=sys.stderr)
+        return FAILURE_EXIT_STATUS
+
+    if arguments.jobs < 1:
+        print(f'Invalid number of jobs: {arguments.jobs}', file=sys.stderr)
+        return FAILURE_EXIT_STATUS
+
     if not os.path.isdir(arguments.path):
         print(f'No such folder: {arguments.path}', file=sys.stderr)
         return FAILURE_EXIT_STATUS
 
     rules = load_rules(arguments.rules)
-    paths = find_paths(arguments.path, recursive=arguments.recursive, follow_symlinks=arguments.follow_symlinks)
-    ignore_paths = {os.path.abspath(arguments.path)}
-    ignore_paths.update(itertools.chain(*(rule.ignore_paths for rule in rules)))
-    for path in (path for path in paths if path not in ignore_paths):
-        for rule in rules:
-            if rule.match(path):
-                if arguments.dry_run:
-                    print(f'{rule.name}: {path}')
-                    continue
-
-                # Potentially updated path, not used as of yet
-                path = rule.apply(path)
-                # Break after the first rule matched. Priority is given by order of appearance
-                break
+    ignore_paths = {os.path.abspath(path) for path in itertools.chain(*(rule.ignore_paths for rule in rules))}
+    entries = find_paths(
+        arguments.path,
+        recursive=arguments.recursive,
+        follow_symlinks=arguments.follow_symlinks,
+        ignore_paths=ignore_paths
+    )
+    process = functools.partial(process_entry, matchers=make_matchers(rules), dry_run=arguments.dry_run)
+    if arguments.jobs == 1:
+        for entry in entries:
+            process(entry)
+    else:
+        process_in_parallel(process, entries, arguments.jobs)
 
     return SUCCESS_EXIT_STATUS
 